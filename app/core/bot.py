@@ -1,5 +1,6 @@
 import os
 import asyncio
+import logging
 from datetime import datetime
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
@@ -11,6 +12,8 @@ from ..handlers.document import document_handler
 from ..utils.language import detect_language
 from ..database.mongodb import db
 
+logger = logging.getLogger(__name__)
+
 class TelegramBot:
     def __init__(self):
         self.app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
@@ -130,20 +133,15 @@ class TelegramBot:
                     # Split long messages and reply in the same chat
                     await self._send_long_message(user_context, response)
                 else:
-                    print(f"Warning: No context found for user {user_id}")
-        except Exception as e:
-            print(f"Error processing messages for user {user_id}: {e}")
+                    logger.warning("No context found for user %s", user_id)
+        except Exception:
+            logger.exception("Error processing messages for user %s", user_id)
         finally:
             self.processing_users.discard(user_id)
             
             # Check for more pending messages
             try:
-                pending_messages = message_handler.db.message_queue.count_documents({
-                    "user_id": user_id,
-                    "is_processed": False
-                })
-                
-                if pending_messages > 0:
+                if message_handler.db.has_pending_messages(user_id):
                     self.processing_users.add(user_id)
                     # Use asyncio.create_task properly
                     try:
@@ -151,14 +149,14 @@ class TelegramBot:
                     except RuntimeError:
                         # If event loop is closed, don't create new tasks
                         pass
-            except Exception as e:
-                print(f"Error checking pending messages: {e}")
+            except Exception:
+                logger.exception("Error checking pending messages for user %s", user_id)
                 # Don't try to create new tasks if there's an error
 
     async def _send_long_message(self, user_context: dict, text: str, max_length: int = 4000):
         """Split and send long messages as replies in the same chat"""
         if not user_context:
-            print("Error: No user context available for sending message")
+            logger.error("No user context available for sending message")
             return
             
         chat_id = user_context['chat_id']
@@ -208,7 +206,7 @@ class TelegramBot:
                     if i < total_parts:
                         await asyncio.sleep(0.5)
                 except Exception as e:
-                    print(f"Error sending message part {i}: {str(e)}")
+                    logger.warning("Error sending message part %s: %s", i, e)
                     # If a part is still too long, split it further
                     if isinstance(e, BadRequest) and "Message is too long" in str(e):
                         # Split into smaller parts
@@ -217,19 +215,19 @@ class TelegramBot:
                             try:
                                 await self.app.bot.send_message(chat_id=chat_id, text=subpart)
                                 await asyncio.sleep(0.5)
-                            except Exception as sub_e:
-                                print(f"Error sending message subpart: {sub_e}")
+                            except Exception:
+                                logger.exception("Error sending message subpart")
                                 
-        except Exception as e:
-            print(f"Error in _send_long_message: {e}")
+        except Exception:
+            logger.exception("Error in _send_long_message for chat %s", chat_id)
             # Fallback: try to send a simple error message
             try:
                 await self.app.bot.send_message(
                     chat_id=chat_id, 
                     text="Sorry, I encountered an error while sending the response. Please try again."
                 )
-            except Exception as fallback_e:
-                print(f"Error sending fallback message: {fallback_e}")
+            except Exception:
+                logger.exception("Error sending fallback message")
 
     async def start(self):
         """Start the bot"""
@@ -245,8 +243,8 @@ class TelegramBot:
             if self.app.running:
                 await self.app.stop()
             await self.app.shutdown()
-        except Exception as e:
-            print(f"Error during bot shutdown: {e}")
+        except Exception:
+            logger.exception("Error during bot shutdown")
 
 # Create a singleton instance
 bot = TelegramBot()
\ No newline at end of file
@@ -1,7 +1,11 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Union
 from datetime import datetime
+import logging
+import numpy as np
+from bson import ObjectId
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
 from pymongo import MongoClient, ASCENDING
-from pymongo.operations import IndexModel
+from pymongo.operations import IndexModel, SearchIndexModel
 
 from ..config import (
     MONGODB_URI, 
@@ -9,20 +13,43 @@ from ..config import (
     MONGODB_COLLECTIONS,
     VECTOR_DIMENSIONS,
     VECTOR_SIMILARITY,
-    VECTOR_INDEX_NAME
+    VECTOR_INDEX_NAME,
+    VECTOR_QUANTIZATION,
+    VECTOR_NUM_CANDIDATES_FACTOR
 )
 
+logger = logging.getLogger(__name__)
+
+def pack_vector(embedding) -> Binary:
+    """Pack an embedding into a BSON float32 vector (binData subtype 9)
+
+    Atlas vector search reads this layout natively: a dtype byte, a padding
+    byte and the little-endian float32 payload.
+    """
+    data = np.ascontiguousarray(embedding, dtype="<f4").tobytes()
+    return Binary(BinaryVectorDtype.FLOAT32.value + b"\x00" + data, VECTOR_SUBTYPE)
+
+def unpack_vector(value) -> np.ndarray:
+    """Read an embedding stored by pack_vector (or a legacy list) as float32"""
+    if isinstance(value, Binary):
+        return np.frombuffer(value, dtype="<f4", offset=2)
+    return np.asarray(value, dtype=np.float32)
+
 class MongoDB:
     def __init__(self):
         self.client = MongoClient(
-            MONGODB_URI,
-            tls=True,
-            tlsAllowInvalidCertificates=True,  # Disable certificate verification for development
-            serverSelectionTimeoutMS=10000  # 5 second timeout
+            MONGODB_URI,  # TLS follows the URI (on by default for mongodb+srv://)
+            serverSelectionTimeoutMS=10000,  # 5 second timeout
+            compressors="zstd,zlib",  # embeddings dominate the payload; zstandard is in requirements
+            maxPoolSize=100,
+            minPoolSize=10,  # keep warm connections for concurrent Telegram updates
+            retryReads=True,
+            appname="bebrik"
         )
         self.db = self.client[MONGODB_DB_NAME]
         self.message_queue = self.db[MONGODB_COLLECTIONS["messages"]]
         self.documents = self.db[MONGODB_COLLECTIONS["documents"]]
+        self.document_chunks = self.db[MONGODB_COLLECTIONS["chunks"]]
         self._setup_indexes()
     
     def _setup_indexes(self):
@@ -34,47 +61,65 @@ class MongoDB:
             # Message queue indexes
             self.message_queue.create_index([("user_id", ASCENDING), ("timestamp", ASCENDING)])
             self.message_queue.create_index([("is_processed", ASCENDING)])
+            # Covers the filter and sort of get_pending_messages
+            self.message_queue.create_index([
+                ("user_id", ASCENDING),
+                ("is_processed", ASCENDING),
+                ("timestamp", ASCENDING)
+            ])
             
             # Document indexes
             self.documents.create_index([("user_id", ASCENDING)])
             self.documents.create_index([("file_hash", ASCENDING)])
-            self.documents.create_index([("chunks.metadata.user_id", ASCENDING)])
             
-            print("Basic indexes created successfully")
+            # Chunk indexes
+            self.document_chunks.create_index([("user_id", ASCENDING)])
+            self.document_chunks.create_index([("file_hash", ASCENDING), ("chunk_index", ASCENDING)])
+            
+            logger.info("Basic indexes created successfully")
             
         except Exception as e:
-            print(f"Warning: Could not create indexes: {str(e)}")
-            print("Application will continue with reduced performance")
+            logger.warning("Could not create indexes: %s", e)
+            logger.warning("Application will continue with reduced performance")
         
         # Vector search index for embeddings (optional)
         try:
-            # Drop existing vector index if exists
-            try:
-                self.documents.drop_index(VECTOR_INDEX_NAME)
-            except:
-                pass
-            
-            # Create new vector search index
-            self.documents.create_index(
-                [("chunks.embedding", "vector")],
-                {
-                    "name": VECTOR_INDEX_NAME,
-                    "vectorSearchOptions": {
+            # user_id is indexed as a filter field so $vectorSearch can pre-filter during traversal
+            definition = {
+                "fields": [
+                    {
+                        "type": "vector",
+                        "path": "embedding",
                         "numDimensions": VECTOR_DIMENSIONS,
-                        "similarity": VECTOR_SIMILARITY
+                        "similarity": VECTOR_SIMILARITY,
+                        "quantization": VECTOR_QUANTIZATION
+                    },
+                    {
+                        "type": "filter",
+                        "path": "user_id"
                     }
-                }
-            )
-            print("Vector search index created successfully")
+                ]
+            }
+            
+            # Atlas rebuilds the index on every update, so only touch it when the definition changed
+            existing = {index["name"]: index for index in self.document_chunks.list_search_indexes()}
+            if VECTOR_INDEX_NAME in existing:
+                if existing[VECTOR_INDEX_NAME].get("latestDefinition") != definition:
+                    self.document_chunks.update_search_index(VECTOR_INDEX_NAME, definition)
+            else:
+                self.document_chunks.create_search_index(
+                    SearchIndexModel(definition=definition, name=VECTOR_INDEX_NAME, type="vectorSearch")
+                )
+            logger.info("Vector search index created successfully")
         except Exception as e:
-            print(f"Error creating vector search index: {str(e)}")
-            print("Attempting to create basic indexes for fallback...")
+            logger.error("Error creating vector search index: %s", e)
+            logger.info("Attempting to create basic indexes for fallback...")
             try:
                 # Create basic indexes for fallback
-                self.documents.create_index([("chunks.content", "text")])
-                print("Basic indexes created successfully")
+                self.document_chunks.create_index([("content", "text")])
+                logger.info("Basic indexes created successfully")
             except Exception as inner_e:
-                print(f"Error creating basic indexes: {str(inner_e)}")
+                logger.error("Error creating basic indexes: %s", inner_e)
     
     def add_message(self, user_id: str, message: str, is_file: bool = False, **kwargs) -> str:
         """Add a message to the queue"""
@@ -98,10 +143,19 @@ class MongoDB:
             "timestamp": {"$gte": cutoff_time}
         }).sort("timestamp", ASCENDING).limit(limit))
     
-    def mark_messages_as_processed(self, message_ids: List[str], batch_id: str):
+    def has_pending_messages(self, user_id: str) -> bool:
+        """Check whether a user has any unprocessed messages (stops at the first match)"""
+        return self.message_queue.find_one(
+            {"user_id": user_id, "is_processed": False},
+            projection={"_id": 1}
+        ) is not None
+    
+    def mark_messages_as_processed(self, message_ids: List[Union[str, ObjectId]], batch_id: str):
         """Mark messages as processed"""
+        # String ids would never match ObjectId _ids (nor use the _id index)
+        ids = [ObjectId(message_id) for message_id in message_ids]
         self.message_queue.update_many(
-            {"_id": {"$in": message_ids}},
+            {"_id": {"$in": ids}},
             {
                 "$set": {
                     "is_processed": True,
@@ -124,90 +178,124 @@ class MongoDB:
         )
     
     def add_document(self, doc_info: Dict[str, Any]) -> str:
-        """Add a document to the database"""
-        # Convert numpy arrays to lists for MongoDB storage
-        if "chunks" in doc_info:
-            for chunk in doc_info["chunks"]:
-                if "embedding" in chunk and hasattr(chunk["embedding"], 'tolist'):
-                    chunk["embedding"] = chunk["embedding"].tolist()
+        """Add a document to the database, storing its chunks one row per chunk"""
+        chunks = doc_info.get("chunks", [])
+        
+        # Store embeddings as packed float32 vectors instead of BSON double arrays
+        pending = [
+            chunk for chunk in chunks
+            if "embedding" in chunk and not isinstance(chunk["embedding"], Binary)
+        ]
+        if pending:
+            # Convert all chunks in one pass, then slice out the raw bytes per row
+            embeddings = np.ascontiguousarray([chunk["embedding"] for chunk in pending], dtype="<f4")
+            dim = embeddings.shape[1]
+            for chunk, embedding in zip(pending, embeddings):
+                chunk["embedding"] = pack_vector(embedding)
+                chunk["dtype"] = "float32"
+                chunk["dim"] = dim
+        
+        parent = {k: v for k, v in doc_info.items() if k != "chunks"}
+        if chunks:
+            # Keep the parent out of duplicate checks until all of its chunk rows are written
+            parent["status"] = "processing"
+        result = self.documents.insert_one(parent)
+        
+        if chunks:
+            try:
+                self.document_chunks.insert_many([
+                    {
+                        "doc_id": result.inserted_id,
+                        "user_id": doc_info["user_id"],
+                        "file_hash": doc_info["file_hash"],
+                        "chunk_index": chunk["metadata"]["chunk_index"],
+                        **chunk
+                    }
+                    for chunk in chunks
+                ], ordered=False)
+            except Exception:
+                # Don't leave a half-written document behind
+                self.document_chunks.delete_many({"doc_id": result.inserted_id})
+                self.documents.delete_one({"_id": result.inserted_id})
+                raise
+            self.documents.update_one(
+                {"_id": result.inserted_id},
+                {"$set": {"status": doc_info.get("status")}}
+            )
         
-        result = self.documents.insert_one(doc_info)
         return str(result.inserted_id)
     
-    def get_document_by_hash(self, file_hash: str) -> Dict[str, Any]:
-        """Get document by file hash"""
-        return self.documents.find_one({"file_hash": file_hash})
+    def get_document_by_hash(self, user_id: str, file_hash: str) -> Dict[str, Any]:
+        """Get a user's fully stored document by file hash"""
+        # Documents still being written, and ones from before chunks moved to
+        # document_chunks (inline chunks[] array), don't count as stored
+        return self.documents.find_one({
+            "user_id": user_id,
+            "file_hash": file_hash,
+            "status": "processed",
+            "chunks": {"$exists": False}
+        })
+    
+    def remove_stale_documents(self, user_id: str, file_hash: str):
+        """Delete a user's unfinished or legacy (inline chunks) copies of a document so it can be re-stored"""
+        stale_ids = [
+            doc["_id"] for doc in self.documents.find(
+                {
+                    "user_id": user_id,
+                    "file_hash": file_hash,
+                    "$or": [
+                        {"status": {"$ne": "processed"}},
+                        {"chunks": {"$exists": True}}
+                    ]
+                },
+                {"_id": 1}
+            )
+        ]
+        if stale_ids:
+            self.document_chunks.delete_many({"doc_id": {"$in": stale_ids}})
+            self.documents.delete_many({"_id": {"$in": stale_ids}})
     
     def get_user_documents(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all documents for a user"""
         return list(self.documents.find({"user_id": user_id}))
     
+    def get_user_chunk_vectors(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get all chunks of a user's documents including their embeddings"""
+        return list(self.document_chunks.find(
+            {"user_id": user_id},
+            {"_id": 0, "content": 1, "metadata": 1, "embedding": 1}
+        ))
+    
     def search_similar_chunks(self, query_vector: List[float], user_id: str, k: int = 3) -> List[Dict[str, Any]]:
         """Search for similar chunks using vector similarity"""
         try:
-            # Convert query vector to list if it's numpy array
-            if hasattr(query_vector, 'tolist'):
-                query_vector = query_vector.tolist()
-            
-            # Use MongoDB Atlas vector search
+            # Use MongoDB Atlas vector search, filtering by user inside the index traversal
             pipeline = [
                 {
-                    "$search": {
+                    "$vectorSearch": {
                         "index": VECTOR_INDEX_NAME,
-                        "knnBeta": {
-                            "vector": query_vector,
-                            "path": "chunks.embedding",
-                            "k": k * 2,  # Get more results initially for better filtering
-                            "filter": {
-                                "equals": {
-                                    "path": "chunks.metadata.user_id",
-                                    "value": user_id
-                                }
-                            }
-                        }
-                    }
-                },
-                {"$unwind": "$chunks"},
-                {
-                    "$match": {
-                        "chunks.metadata.user_id": user_id
+                        "path": "embedding",
+                        "queryVector": pack_vector(query_vector),
+                        "numCandidates": k * VECTOR_NUM_CANDIDATES_FACTOR,
+                        "limit": k,
+                        "filter": {"user_id": user_id}
                     }
                 },
                 {
                     "$project": {
                         "_id": 0,
-                        "content": "$chunks.content",
-                        "metadata": "$chunks.metadata",
-                        "score": {"$meta": "searchScore"}
+                        "content": 1,
+                        "metadata": 1,
+                        "score": {"$meta": "vectorSearchScore"}
                     }
-                },
-                {"$sort": {"score": -1}},
-                {"$limit": k}
+                }
             ]
 
-            results = list(self.documents.aggregate(pipeline))
+            results = list(self.document_chunks.aggregate(pipeline))
             
             if not results:
-                # Fallback to basic similarity search without vector operations
-                basic_pipeline = [
-                    {"$unwind": "$chunks"},
-                    {
-                        "$match": {
-                            "chunks.metadata.user_id": user_id
-                        }
-                    },
-                    {
-                        "$project": {
-                            "_id": 0,
-                            "content": "$chunks.content",
-                            "metadata": "$chunks.metadata",
-                            "score": 1
-                        }
-                    },
-                    {"$limit": k}
-                ]
-                
-                results = list(self.documents.aggregate(basic_pipeline))
+                # Fallback to basic retrieval without vector operations
+                results = self._get_user_chunks(user_id, k)
             
             # Process results to ensure uniqueness and quality
             unique_results = []
@@ -222,26 +310,20 @@ class MongoDB:
             return unique_results[:k]
             
         except Exception as e:
-            print(f"Error in vector search: {str(e)}")
-            # If vector search fails completely, try simple document retrieval
+            logger.error("Error in vector search for user %s: %s", user_id, e)
+            # If vector search fails completely, try simple chunk retrieval
             try:
-                basic_results = list(self.documents.aggregate([
-                    {"$unwind": "$chunks"},
-                    {"$match": {"chunks.metadata.user_id": user_id}},
-                    {"$limit": k},
-                    {
-                        "$project": {
-                            "_id": 0,
-                            "content": "$chunks.content",
-                            "metadata": "$chunks.metadata",
-                            "score": 1
-                        }
-                    }
-                ]))
-                return basic_results
+                return self._get_user_chunks(user_id, k)
             except Exception as inner_e:
-                print(f"Error in fallback search: {str(inner_e)}")
+                logger.error("Error in fallback search for user %s: %s", user_id, inner_e)
                 return []
+    
+    def _get_user_chunks(self, user_id: str, k: int) -> List[Dict[str, Any]]:
+        """Get the first k chunks of a user's documents without scoring"""
+        return list(self.document_chunks.find(
+            {"user_id": user_id},
+            {"_id": 0, "content": 1, "metadata": 1}
+        ).limit(k))
 
 # Create a singleton instance
 db = MongoDB()
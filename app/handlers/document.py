@@ -1,18 +1,62 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
+from collections import OrderedDict
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, UnstructuredFileLoader
 from langchain.chains import RetrievalQA
 from langchain_xai import ChatXAI
 from langchain.schema import Document as LangchainDocument
 import os
-import mimetypes
-from langchain.prompts import ChatPromptTemplate
+import asyncio
+import logging
+import numpy as np
+from langchain.prompts import ChatPromptTemplate, PromptTemplate
 
-from ..config import CHUNK_SIZE, CHUNK_OVERLAP, VECTOR_INDEX_NAME, VECTOR_DIMENSIONS, LLM_MODEL, XAI_API_KEY
-from ..database.mongodb import db
+from ..config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    VECTOR_INDEX_NAME,
+    VECTOR_DIMENSIONS,
+    LLM_MODEL,
+    XAI_API_KEY,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    USER_INDEX_CACHE_SIZE
+)
+from ..database.mongodb import db, unpack_vector
 from ..models.document import Document
 from ..services.embedding import embedding_service
+from ..services.user_index import UserVectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Loader class per file extension; anything else goes through UnstructuredFileLoader
+_LOADERS = {
+    ".pdf": PyPDFLoader,
+    ".doc": Docx2txtLoader,
+    ".docx": Docx2txtLoader
+}
+
+# Answer prompt for query_documents, compiled once at import
+_QA_PROMPT = PromptTemplate(
+    template="""You are a knowledgeable assistant providing clear and concise information.
+
+            Context:
+            {context}
+
+            Question: {question}
+
+            Instructions:
+            1. Answer directly and naturally, as if you inherently know the information
+            2. Don't say phrases like "According to the document" or "I found in the documents"
+            3. Don't mention sources unless specifically asked
+            4. Keep the answer focused and to the point
+            5. Use a conversational but professional tone
+            6. If information isn't available, say so briefly and clearly
+            7. Avoid repeating information
+
+            Answer:""",
+    input_variables=["context", "question"]
+)
 
 class DocumentHandler:
     def __init__(self):
@@ -27,6 +71,9 @@ class DocumentHandler:
         # Use the HuggingFace embedding service
         self.embedding_service = embedding_service
         self.embedding_dim = self.embedding_service.dimensions
+        self._query_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()  # LRU cache
+        # Per-user chunk vectors kept in memory to skip Atlas round-trips
+        self.user_index = UserVectorIndex(self._load_user_vectors, self.embedding_dim, USER_INDEX_CACHE_SIZE)
         
         # Initialize xAI Chat model
         self.llm = ChatXAI(
@@ -34,82 +81,93 @@ class DocumentHandler:
             model=LLM_MODEL,
             temperature=0.7
         )
-        
-        mimetypes.init()
+        self.qa_chain = _QA_PROMPT | self.llm
+    
+    async def _embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for documents as a float32 matrix (one row per text)"""
+        embeddings = await self.embedding_service.embed_documents(texts)
+        return np.asarray(embeddings, dtype=np.float32)
     
-    async def _embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for documents using the HuggingFace service"""
-        return await self.embedding_service.embed_documents(texts)
+    async def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries in one batch, reusing cached embeddings of recent queries"""
+        embeddings = {}
+        for query in queries:
+            if query in self._query_embeddings:
+                self._query_embeddings.move_to_end(query)
+                embeddings[query] = self._query_embeddings[query]
+        
+        missing = [query for query in queries if query not in embeddings]
+        if missing:
+            for query, embedding in zip(missing, await self._embed_documents(missing)):
+                embeddings[query] = embedding
+                # Failed requests come back as zero vectors, don't cache those
+                if embedding.any():
+                    self._query_embeddings[query] = embedding
+            while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        
+        return np.stack([embeddings[query] for query in queries])
     
-    async def _embed_query(self, query: str) -> List[float]:
-        """Generate embedding for query using the HuggingFace service"""
-        return await self.embedding_service.embed_query(query)
+    def _load_user_vectors(self, user_id: str) -> List[Tuple[np.ndarray, Dict[str, Any]]]:
+        """Load a user's chunks with unpacked embeddings (blocking, run in a worker thread)"""
+        return [
+            (unpack_vector(chunk.pop("embedding", [])), chunk)
+            for chunk in self.db.get_user_chunk_vectors(user_id)
+        ]
     
     def _get_loader(self, file_path: str):
-        """Get appropriate loader based on file type"""
-        mime_type, _ = mimetypes.guess_type(file_path)
+        """Get appropriate loader based on file extension"""
+        extension = os.path.splitext(file_path)[1].lower()
+        return _LOADERS.get(extension, UnstructuredFileLoader)(file_path)
+    
+    def _load_and_split(self, file_path: str, metadata: Dict[str, Any]) -> List[LangchainDocument]:
+        """Load a file and split it into chunks (blocking, run in a worker thread)"""
+        loader = self._get_loader(file_path)
+        raw_documents = loader.load()
         
-        if mime_type == 'application/pdf':
-            return PyPDFLoader(file_path)
-        elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-            return Docx2txtLoader(file_path)
-        else:
-            # Fallback to simple text reading for unsupported file types
-            try:
-                from langchain_community.document_loaders import UnstructuredFileLoader
-                return UnstructuredFileLoader(file_path)
-            except ImportError:
-                # If unstructured is not available, use a simple text loader
-                from langchain_community.document_loaders import TextLoader
-                return TextLoader(file_path)
+        # Split page by page instead of concatenating the whole document first
+        return self.text_splitter.create_documents(
+            texts=[doc.page_content for doc in raw_documents],
+            metadatas=[metadata] * len(raw_documents)
+        )
     
     async def process_document(self, file_path: str, user_id: str) -> Dict[str, Any]:
         """Process a document and store it with embeddings in MongoDB"""
         try:
-            # Create document instance
-            document = Document.create(user_id, file_path)
+            # Create document instance (hashes the file, so keep it off the event loop)
+            document = await asyncio.to_thread(Document.create, user_id, file_path)
             
             # Check if document already exists
-            existing_doc = self.db.get_document_by_hash(document.file_hash)
+            existing_doc = self.db.get_document_by_hash(user_id, document.file_hash)
             if existing_doc:
                 return {"status": "exists", "doc_id": existing_doc["_id"]}
             
-            # Load and split document
-            loader = self._get_loader(file_path)
-            raw_documents = loader.load()
+            # Replace interrupted or pre-document_chunks copies of this file
+            self.db.remove_stale_documents(user_id, document.file_hash)
             
-            # Combine all text from the document
-            full_text = "\n\n".join([doc.page_content for doc in raw_documents])
-            
-            # Split into chunks with better context preservation
-            chunks = self.text_splitter.create_documents(
-                texts=[full_text],
-                metadatas=[{
-                    "user_id": user_id,
-                    "file_hash": document.file_hash,
-                    "file_name": os.path.basename(file_path),
-                    "source": file_path
-                }]
-            )
+            # Parsing and splitting are CPU-bound, run them in a worker thread
+            chunks = await asyncio.to_thread(self._load_and_split, file_path, {
+                "user_id": user_id,
+                "file_hash": document.file_hash,
+                "file_name": os.path.basename(file_path),
+                "source": file_path
+            })
             
             # Update document with chunk information
             document.chunk_count = len(chunks)
             
-            # Get embeddings for all chunks using the service
-            chunk_texts = [chunk.page_content for chunk in chunks]
+            # Skip empty chunks before embedding, keeping their original indexes
+            chunk_texts = [chunk.page_content.strip() for chunk in chunks]
+            keep = [i for i, chunk_text in enumerate(chunk_texts) if chunk_text]
             
-            print(f"Generating embeddings for {len(chunk_texts)} chunks using {type(self.embedding_service).__name__}...")
-            all_embeddings = await self._embed_documents(chunk_texts)
+            logger.info("Generating embeddings for %d chunks using %s...", len(keep), type(self.embedding_service).__name__)
+            all_embeddings = await self._embed_documents([chunk_texts[i] for i in keep])
             
             # Create chunks with embeddings and better metadata
             chunks_data = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, all_embeddings)):
+            for i, embedding in zip(keep, all_embeddings):
                 chunk_id = f"{document.file_hash}_{i}"
-                chunk_text = chunk.page_content.strip()
-                
-                # Skip empty chunks
-                if not chunk_text:
-                    continue
+                chunk_text = chunk_texts[i]
                 
                 # Create chunk metadata
                 chunk_metadata = {
@@ -140,6 +198,7 @@ class DocumentHandler:
             
             # Store document in MongoDB
             doc_id = self.db.add_document(document.to_dict())
+            self.user_index.invalidate(user_id)
             
             return {
                 "status": "success",
@@ -172,29 +231,37 @@ class DocumentHandler:
                 }
 
             # Generate semantic variations for better search coverage
-            semantic_variations = [
+            # (deduplicated: the clean query usually equals the original one)
+            semantic_variations = list(dict.fromkeys(variation for variation in [
                 query,  # Original query
                 f"find information about {query}",  # Explicit search
                 f"what does the document say about {query}",  # Document-focused
                 f"find content related to {query}",  # Related content
                 query.replace("?", "").strip(),  # Clean query
                 f"extract information about {query}"  # Information extraction
-            ]
+            ] if variation))
             
             all_chunks = []
             seen_chunk_ids = set()
             
-            # Search with each variation and collect results
-            for variation in semantic_variations:
-                # Get embedding for the variation using the service
-                query_embedding = await self._embed_query(variation)
-                
-                # Search similar chunks
-                chunks = self.db.search_similar_chunks(query_embedding, user_id, k=5)
-                
-                # Add unique chunks to results
+            # Embed all variations in one batched request
+            query_embeddings = await self._embed_queries(semantic_variations)
+            
+            user_index = await self.user_index.get(user_id)
+            if user_index[1]:
+                # Search all variations against the in-memory index at once
+                search_results = self.user_index.search(user_index, query_embeddings, 5)
+            else:
+                # Search with every variation concurrently (the MongoDB client is thread-safe)
+                search_results = await asyncio.gather(*[
+                    asyncio.to_thread(self.db.search_similar_chunks, query_embedding, user_id, 5)
+                    for query_embedding in query_embeddings
+                ])
+            
+            # Add unique chunks to results
+            for chunks in search_results:
                 for chunk in chunks:
-                    chunk_id = f"{chunk['metadata'].get('file_hash', '')}_{chunk['metadata'].get('chunk_index', '')}"
+                    chunk_id = (chunk['metadata'].get('file_hash', ''), chunk['metadata'].get('chunk_index', ''))
                     if chunk_id not in seen_chunk_ids:
                         seen_chunk_ids.add(chunk_id)
                         all_chunks.append(chunk)
@@ -205,81 +272,40 @@ class DocumentHandler:
                     "sources": []
                 }
             
-            # Sort chunks by similarity score
-            all_chunks.sort(key=lambda x: x.get("score", 0), reverse=True)
+            # Sort chunks by similarity score (stable, so ties keep retrieval order)
+            scores = np.fromiter(
+                (chunk.get("score", 0) for chunk in all_chunks),
+                dtype=np.float32,
+                count=len(all_chunks)
+            )
+            all_chunks = [all_chunks[i] for i in np.argsort(-scores, kind="stable")]
             
             # Take top k most relevant chunks
             top_chunks = all_chunks[:k]
             
-            # Create context with full content
-            contexts = []
+            # Build the context string and the sources list in a single pass
+            context_parts = []
             sources = []
             
             for chunk in top_chunks:
                 metadata = chunk["metadata"]
-                score = chunk.get("score", 0)
                 
-                # Create Langchain Document objects
-                doc = LangchainDocument(
-                    page_content=chunk["content"],
-                    metadata={
-                        "source": metadata.get("file_name", "Unknown"),
-                        "section": metadata.get("chunk_index", 0) + 1,
-                        "score": score
-                    }
+                context_parts.append(
+                    f"From {metadata.get('file_name', 'Unknown')} "
+                    f"(Section {metadata.get('chunk_index', 0) + 1}):\n{chunk['content']}"
                 )
-                contexts.append(doc)
                 
                 # Add to sources with full content
                 sources.append({
                     "content": chunk["content"],
                     "metadata": metadata,
-                    "similarity_score": score
+                    "similarity_score": chunk.get("score", 0)
                 })
             
-            # Create context string from documents
-            context_str = "\n\n".join([
-                f"From {doc.metadata['source']} (Section {doc.metadata['section']}):\n{doc.page_content}"
-                for doc in contexts
-            ])
-
-            # Create prompt template
-            from langchain.prompts import PromptTemplate
-            from langchain_core.runnables import RunnablePassthrough
-            
-            prompt = PromptTemplate(
-                template="""You are a knowledgeable assistant providing clear and concise information.
-
-            Context:
-            {context}
-
-            Question: {question}
+            context_str = "\n\n".join(context_parts)
 
-            Instructions:
-            1. Answer directly and naturally, as if you inherently know the information
-            2. Don't say phrases like "According to the document" or "I found in the documents"
-            3. Don't mention sources unless specifically asked
-            4. Keep the answer focused and to the point
-            5. Use a conversational but professional tone
-            6. If information isn't available, say so briefly and clearly
-            7. Avoid repeating information
-
-            Answer:""",
-                input_variables=["context", "question"]
-            )
-            
-            # Create chain using xAI Chat model
-            chain = (
-                {
-                    "context": lambda x: context_str,
-                    "question": lambda x: x["question"]
-                }
-                | prompt
-                | self.llm
-            )
-            
-            # Get response using the new invoke method
-            response = chain.invoke({"question": query})
+            # Await the completion so the event loop keeps serving other users meanwhile
+            response = await self.qa_chain.ainvoke({"context": context_str, "question": query})
             answer = response.content if hasattr(response, 'content') else str(response)
             
 
@@ -291,7 +317,7 @@ class DocumentHandler:
             }
 
         except Exception as e:
-            print(f"Error in query_documents: {str(e)}")
+            logger.error("Error in query_documents: %s", e)
             # Fallback to direct content return
             if all_chunks:
                 answer = "Here's what I found in the documents:\n\n"
@@ -1,6 +1,7 @@
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 import asyncio
+import logging
 from langchain_xai import ChatXAI
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder, HumanMessagePromptTemplate
@@ -16,6 +17,8 @@ from ..utils.text import normalize_text
 from ..utils.language import detect_language
 from .document import document_handler
 
+logger = logging.getLogger(__name__)
+
 class MessageHandler:
     def __init__(self):
         self.llm = ChatXAI(
@@ -82,6 +85,8 @@ class MessageHandler:
             Tool(
                 name="Document Query",
                 func=self.sync_query_documents,
+                # agent.ainvoke awaits this on the main loop instead of running func in a thread
+                coroutine=self.async_query_documents,
                 description="Search for information in user's documents"
             ),
             Tool(
@@ -94,33 +99,6 @@ class MessageHandler:
         # Add current_user_id attribute
         self.current_user_id = None
         
-        # Create agent with updated prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a knowledgeable assistant that provides clear and natural responses while maintaining conversation context.
-
-Key principles:
-1. Be direct and concise
-2. Use a conversational but professional tone
-3. Don't mention using tools or searching documents
-4. Respond naturally as if you inherently know the information
-5. Keep responses focused and relevant
-6. For Turkish, use ASCII characters (ğ->g, ü->u, ş->s, ı->i, ö->o, ç->c)
-7. Always consider previous conversation context
-8. Reference previous exchanges when relevant
-9. Maintain a coherent conversation flow
-10. If a question refers to previous context, use that context in your response
-
-Available tools:
-{tools}
-
-To use a tool, use this format:
-Action: the action to take, should be one of [{tool_names}]
-Action Input: the input to the action
-Observation: the result of the action"""),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
-        ])
-        
         # Initialize agent with ReAct prompt
         self.agent = initialize_agent(
             tools=self.tools,
@@ -239,8 +217,8 @@ Observation: the result of the action"""),
                 }
             }
 
-        except Exception as e:
-            print(f"Error getting document context: {str(e)}")
+        except Exception:
+            logger.exception("Error getting document context for user %s", user_id)
             return {"context": "", "sources": [], "available_docs": [], "stats": {}}
     
     async def process_messages(self, messages: List[Dict[str, Any]], user_id: str) -> str:
@@ -374,8 +352,8 @@ Instructions:
             
             return response
             
-        except Exception as e:
-            print(f"Error in process_messages: {str(e)}")
+        except Exception:
+            logger.exception("Error in process_messages for user %s", user_id)
             # Fall back to direct document content if available
             if all_responses and all_responses[0].get("answer"):
                 return all_responses[0]["answer"]
@@ -414,7 +392,7 @@ Instructions:
             return response
             
         except Exception as e:
-            print(f"Error processing messages for user {user_id}: {str(e)}")
+            logger.error("Error processing messages for user %s: %s", user_id, e)
             if 'message_ids' in locals():
                 self.db.message_queue.update_many(
                     {"_id": {"$in": message_ids}},
@@ -427,6 +405,27 @@ Instructions:
                 )
             raise
     
+    def _format_query_result(self, result: Any) -> Dict[str, Any]:
+        """Format a query_documents result for better readability in the agent"""
+        if isinstance(result, dict):
+            return {
+                "answer": result.get("answer", "No relevant information found."),
+                "sources": [
+                    f"From {s['metadata'].get('file_name', 'Unknown')}: {s['content'][:200]}..."
+                    for s in result.get("sources", [])
+                ]
+            }
+        return {"answer": "No results found", "sources": []}
+    
+    async def async_query_documents(self, query: str) -> Dict[str, Any]:
+        """Async version of query_documents for the agent tool"""
+        try:
+            result = await document_handler.query_documents(query, self.current_user_id)
+            return self._format_query_result(result)
+        except Exception:
+            logger.exception("Error in async_query_documents for user %s", self.current_user_id)
+            return {"answer": "Error querying documents", "sources": []}
+    
     def sync_query_documents(self, query: str) -> Dict[str, Any]:
         """Synchronous version of query_documents for the agent tool"""
         try:
@@ -442,20 +441,10 @@ Instructions:
                 document_handler.query_documents(query, self.current_user_id)
             )
             
-            # Format the result for better readability
-            if isinstance(result, dict):
-                formatted_result = {
-                    "answer": result.get("answer", "No relevant information found."),
-                    "sources": [
-                        f"From {s['metadata'].get('file_name', 'Unknown')}: {s['content'][:200]}..."
-                        for s in result.get("sources", [])
-                    ]
-                }
-                return formatted_result
-            return {"answer": "No results found", "sources": []}
+            return self._format_query_result(result)
             
-        except Exception as e:
-            print(f"Error in sync_query_documents: {str(e)}")
+        except Exception:
+            logger.exception("Error in sync_query_documents for user %s", self.current_user_id)
             return {"answer": "Error querying documents", "sources": []}
 
 # Create a singleton instance
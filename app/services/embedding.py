@@ -61,6 +61,10 @@ class HuggingFaceEmbeddingService(EmbeddingServiceBase):
         self._dimensions = self._get_model_dimensions(model)
         self.rate_limit_delay = 0.2  # 200ms between requests for stability
         self._client = None  # Lazy initialization
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
         
     def _get_model_dimensions(self, model: str) -> int:
         """Get embedding dimensions based on model name"""
@@ -113,16 +117,11 @@ class HuggingFaceEmbeddingService(EmbeddingServiceBase):
         - Task: feature-extraction (not pipeline/sentence-similarity)
         - Returns: Dense vector embeddings for similarity search
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         for attempt in range(retries):
             try:
                 response = await self.client.post(
                     self.base_url,  # Use direct model endpoint, not pipeline
-                    headers=headers,
+                    headers=self._headers,
                     json=payload
                 )
                 
@@ -135,7 +134,7 @@ class HuggingFaceEmbeddingService(EmbeddingServiceBase):
                             if isinstance(embedding, list) and len(embedding) > 0:
                                 # Ensure correct dimensions
                                 if len(embedding) != self.dimensions:
-                                    logger.warning(f"Unexpected embedding size: {len(embedding)}, expected {self.dimensions}")
+                                    logger.warning("Unexpected embedding size: %d, expected %d", len(embedding), self.dimensions)
                                     # Pad or truncate to expected size
                                     if len(embedding) < self.dimensions:
                                         embedding.extend([0.0] * (self.dimensions - len(embedding)))
@@ -143,36 +142,36 @@ class HuggingFaceEmbeddingService(EmbeddingServiceBase):
                                         embedding = embedding[:self.dimensions]
                                 valid_embeddings.append(embedding)
                             else:
-                                logger.warning(f"Invalid embedding at index {i}")
+                                logger.warning("Invalid embedding at index %d", i)
                                 valid_embeddings.append([0.0] * self.dimensions)
                         
-                        logger.info(f"Successfully generated {len(valid_embeddings)} embeddings")
+                        logger.info("Successfully generated %d embeddings", len(valid_embeddings))
                         return valid_embeddings
                     else:
-                        logger.error(f"Unexpected response format: {type(result)} - {result}")
+                        logger.error("Unexpected response format: %s - %s", type(result), result)
                         return []
                         
                 elif response.status_code == 503:
                     # Model loading, wait and retry
                     wait_time = 2 ** attempt
-                    logger.warning(f"Model loading, waiting {wait_time}s before retry {attempt + 1}")
+                    logger.warning("Model loading, waiting %ds before retry %d", wait_time, attempt + 1)
                     await asyncio.sleep(wait_time)
                     continue
                     
                 elif response.status_code == 429:
                     # Rate limited, wait and retry
                     wait_time = 2 ** attempt
-                    logger.warning(f"Rate limited, waiting {wait_time}s before retry {attempt + 1}")
+                    logger.warning("Rate limited, waiting %ds before retry %d", wait_time, attempt + 1)
                     await asyncio.sleep(wait_time)
                     continue
                     
                 else:
-                    logger.error(f"API request failed with status {response.status_code}: {response.text}")
+                    logger.error("API request failed with status %d: %s", response.status_code, response.text)
                     if attempt == retries - 1:
                         return []
                     
             except Exception as e:
-                logger.error(f"Request failed (attempt {attempt + 1}): {str(e)}")
+                logger.error("Request failed (attempt %d): %s", attempt + 1, e)
                 if attempt == retries - 1:
                     return []
                 await asyncio.sleep(1)
@@ -208,15 +207,15 @@ class HuggingFaceEmbeddingService(EmbeddingServiceBase):
                 
                 if batch_embeddings:
                     all_embeddings.extend(batch_embeddings)
-                    logger.info(f"Generated embeddings for batch {i//EMBEDDING_BATCH_SIZE + 1}, {len(batch)} texts")
+                    logger.info("Generated embeddings for batch %d, %d texts", i//EMBEDDING_BATCH_SIZE + 1, len(batch))
                 else:
                     # Add zero embeddings for failed batch
                     zero_embedding = [0.0] * self.dimensions
                     all_embeddings.extend([zero_embedding] * len(batch))
-                    logger.error(f"Failed to generate embeddings for batch {i//EMBEDDING_BATCH_SIZE + 1}")
+                    logger.error("Failed to generate embeddings for batch %d", i//EMBEDDING_BATCH_SIZE + 1)
                 
             except Exception as e:
-                logger.error(f"Error generating embeddings for batch {i//EMBEDDING_BATCH_SIZE + 1}: {str(e)}")
+                logger.error("Error generating embeddings for batch %d: %s", i//EMBEDDING_BATCH_SIZE + 1, e)
                 # Add zero embeddings for failed batch
                 zero_embedding = [0.0] * self.dimensions
                 all_embeddings.extend([zero_embedding] * len(batch))
@@ -243,7 +242,7 @@ class HuggingFaceEmbeddingService(EmbeddingServiceBase):
                 return [0.0] * self.dimensions
                 
         except Exception as e:
-            logger.error(f"Error generating query embedding: {str(e)}")
+            logger.error("Error generating query embedding: %s", e)
             return [0.0] * self.dimensions
     
     @property
@@ -264,16 +263,17 @@ class LocalFallbackEmbeddingService(EmbeddingServiceBase):
     
     async def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Generate simple text-based embeddings"""
-        embeddings = []
-        for text in texts:
-            embedding = self._simple_text_embedding(text)
-            embeddings.append(embedding)
-        return embeddings
+        # Feature extraction is pure CPU work, keep it off the event loop
+        return await asyncio.to_thread(self._embed_all, texts)
     
     async def embed_query(self, query: str) -> List[float]:
         """Generate simple text-based embedding for query"""
         return self._simple_text_embedding(query)
     
+    def _embed_all(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for all texts synchronously"""
+        return [self._simple_text_embedding(text) for text in texts]
+    
     def _simple_text_embedding(self, text: str) -> List[float]:
         """Create a simple text embedding based on character and word features"""
         import hashlib
@@ -330,7 +330,7 @@ class EmbeddingServiceFactory:
             return LocalFallbackEmbeddingService()
         
         else:
-            logger.warning(f"Unknown embedding service: {service_type}, using HuggingFace")
+            logger.warning("Unknown embedding service: %s, using HuggingFace", service_type)
             return EmbeddingServiceFactory.create_service("huggingface")
 
 # Create singleton instance
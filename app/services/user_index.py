@@ -0,0 +1,77 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# (normalized chunk vectors, chunks) of one user; row i of the matrix belongs to chunks[i]
+UserIndex = Tuple[np.ndarray, List[Dict[str, Any]]]
+
+class UserVectorIndex:
+    """
+    Per-user chunk vectors kept in memory for exact cosine search
+
+    Indexes are loaded on first use and kept in an LRU cache of max_users entries.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[str], Iterable[Tuple[np.ndarray, Dict[str, Any]]]],
+        dim: int,
+        max_users: int
+    ):
+        self._load = load  # blocking (vector, chunk) loader, run in a worker thread
+        self.dim = dim
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, UserIndex]" = OrderedDict()
+        # Bumped on every invalidation, so a load that overlapped one isn't cached
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, user_id: str) -> UserIndex:
+        """Get the index of a user's chunks, loading it on first use"""
+        if user_id in self._indexes:
+            self._indexes.move_to_end(user_id)
+            return self._indexes[user_id]
+
+        generation = self._generations.get(user_id, 0)
+        vectors = []
+        chunks = []
+        for vector, chunk in await asyncio.to_thread(self._load, user_id):
+            # Skip chunks embedded with a different model than the current one
+            if len(vector) == self.dim:
+                vectors.append(vector)
+                chunks.append(chunk)
+
+        matrix = np.stack(vectors).astype(np.float32) if vectors else np.empty((0, self.dim), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        index = (matrix / np.where(norms == 0, 1, norms), chunks)
+
+        # The user's chunks changed while loading; this snapshot may predate that
+        if self._generations.get(user_id, 0) != generation:
+            return index
+
+        self._indexes[user_id] = index
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, user_id: str):
+        """Drop a user's cached index after their chunks changed"""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self._indexes.pop(user_id, None)
+
+    @staticmethod
+    def search(index: UserIndex, query_embeddings: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        """Exact cosine search of every query against a user's index"""
+        matrix, chunks = index
+        norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        queries = query_embeddings / np.where(norms == 0, 1, norms)
+
+        # Same scale as Atlas vectorSearchScore for cosine similarity
+        scores = (1 + queries @ matrix.T) / 2
+
+        results = []
+        for row in scores:
+            top = np.argsort(-row, kind="stable")[:k]
+            results.append([{**chunks[i], "score": float(row[i])} for i in top])
+        return results
@@ -1,5 +1,10 @@
-from langdetect import detect
+from functools import lru_cache
+from langdetect import DetectorFactory, detect
 
+# langdetect is randomized by default; seed it so repeated texts get the same answer
+DetectorFactory.seed = 0
+
+@lru_cache(maxsize=4096)
 def detect_language(text: str) -> str:
     """
     Detect the language of the input text
@@ -0,0 +1,73 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+from ..config import LOG_LEVEL
+
+# Chatty dependencies pinned to WARNING regardless of LOG_LEVEL
+_QUIET_LOGGERS = ("httpx", "httpcore", "telegram", "pymongo")
+
+# Background thread that writes queued records to the console
+listener: Optional[logging.handlers.QueueListener] = None
+# Root handler feeding the listener's queue
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Configure root logging so callers only enqueue records
+
+    QueueHandler.prepare() still merges the message arguments and renders
+    tracebacks on the caller's thread; only the line template and the stdout
+    write run on the QueueListener thread, keeping blocking console I/O off
+    the event loop.
+    """
+    global listener, _queue_handler
+    if listener is not None:
+        return listener
+
+    # The format below uses none of these, so skip collecting them per LogRecord
+    logging.logProcesses = False
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False  # Python 3.12+
+    logging._srcfile = None  # skips the findCaller() frame walk (no %(lineno)d/%(funcName)s)
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter(
+        fmt="%(asctime)s - %(levelname)s - [%(name)s] %(message)s",
+        datefmt="%H:%M:%S"
+    ))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+
+    # LOG_LEVEL applies to our own loggers only; third-party libraries stay at
+    # WARNING (httpx logs every request URL at INFO, and the Telegram polling
+    # URL contains the bot token)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.WARNING)
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root_logger.addHandler(_queue_handler)
+    logging.getLogger("app").setLevel(LOG_LEVEL)
+    for name in _QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    listener.start()
+    atexit.register(stop_logging)
+    return listener
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global listener, _queue_handler
+    # Detach the queue first so later records fall back to the last-resort
+    # stderr handler instead of piling up in a queue nobody drains
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler.close()
+        _queue_handler = None
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -1,5 +1,10 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.utils.logging import setup_logging, stop_logging
+
+# Configure logging before the app modules create their singletons
+setup_logging()
+
 from app.core.bot import bot
 
 @asynccontextmanager
@@ -10,6 +15,7 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     await bot.stop()
+    stop_logging()  # drain queued log records before the process exits
 
 # Initialize FastAPI with lifespan
 app = FastAPI(
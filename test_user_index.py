@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory per-user vector index (search ranking, scores and invalidation)
+"""
+
+import asyncio
+import sys
+import os
+import threading
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.services.user_index import UserVectorIndex
+
+# Four 3-d chunks; the last one has a different dimension and must be skipped
+CHUNKS = [
+    (np.array([1.0, 0.0, 0.0]), {"content": "x"}),
+    (np.array([0.0, 2.0, 0.0]), {"content": "y"}),
+    (np.array([1.0, 1.0, 0.0]), {"content": "xy"}),
+    (np.array([-3.0, 0.0, 0.0]), {"content": "-x"}),
+    (np.array([1.0, 0.0]), {"content": "old model"}),
+]
+
+def test_search_order_and_scores():
+    """Top-k comes back in exact cosine order on the (1 + cos) / 2 scale"""
+    user_index = UserVectorIndex(lambda user_id: CHUNKS, dim=3, max_users=10)
+    index = asyncio.run(user_index.get("user"))
+    assert [chunk["content"] for chunk in index[1]] == ["x", "y", "xy", "-x"]
+
+    queries = np.array([[2.0, 0.0, 0.0], [0.0, 0.0, 0.0]], dtype=np.float32)
+    by_x, by_zero = UserVectorIndex.search(index, queries, k=3)
+
+    assert [chunk["content"] for chunk in by_x] == ["x", "xy", "y"]
+    assert np.allclose([chunk["score"] for chunk in by_x], [1.0, (1 + 1 / np.sqrt(2)) / 2, 0.5])
+    # Opposite vector scores 0, ranked last
+    assert UserVectorIndex.search(index, queries[:1], k=4)[0][-1]["content"] == "-x"
+    assert UserVectorIndex.search(index, queries[:1], k=4)[0][-1]["score"] == 0.0
+    # A zero query (failed embedding) scores everything 0.5 instead of NaN
+    assert [chunk["score"] for chunk in by_zero] == [0.5, 0.5, 0.5]
+
+def test_index_is_cached():
+    """A user's index is loaded once and reused until invalidated"""
+    calls = []
+
+    def load(user_id):
+        calls.append(user_id)
+        return CHUNKS
+
+    user_index = UserVectorIndex(load, dim=3, max_users=10)
+
+    async def run():
+        first = await user_index.get("user")
+        assert await user_index.get("user") is first
+        user_index.invalidate("user")
+        assert await user_index.get("user") is not first
+
+    asyncio.run(run())
+    assert calls == ["user", "user"]
+
+def test_invalidation_during_load():
+    """An index loaded before an invalidation isn't cached"""
+    loading = threading.Event()
+    release = threading.Event()
+    snapshots = [CHUNKS[:1], CHUNKS[:2]]
+
+    def load(user_id):
+        loading.set()
+        release.wait(5)
+        return snapshots.pop(0)
+
+    user_index = UserVectorIndex(load, dim=3, max_users=10)
+
+    async def run():
+        pending = asyncio.create_task(user_index.get("user"))
+        await asyncio.to_thread(loading.wait, 5)
+        # A document upload finishes while the old snapshot is still loading
+        user_index.invalidate("user")
+        release.set()
+        stale = await pending
+        assert len(stale[1]) == 1
+
+        fresh = await user_index.get("user")
+        assert len(fresh[1]) == 2
+
+    asyncio.run(run())
+    assert snapshots == []
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing UserVectorIndex")
+    print("=" * 50)
+
+    for test in (test_search_order_and_scores, test_index_is_cached, test_invalidation_during_load):
+        test()
+        print(f"✅ {test.__name__}")
+
+if __name__ == "__main__":
+    main()